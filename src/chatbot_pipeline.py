@@ -3,9 +3,12 @@ from entity_extractor import EntityExtractor
 from synonyms import SYNONYMS, canonicalize
 from responses import get_response
 
-from rapidfuzz import process
+from concurrent.futures import ThreadPoolExecutor
+from rapidfuzz import process, fuzz
+import numpy as np
 from transformers.utils import logging as hf_logging
-import warnings, re
+import torch
+import warnings, re, os
 
 # Silence noisy warnings
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -15,29 +18,115 @@ hf_logging.set_verbosity_error()
 # Required and optional entities for pet search
 REQUIRED_ENTITIES = ["PET_TYPE", "STATE"]
 OPTIONAL_ENTITIES = ["BREED", "COLOR", "SIZE", "GENDER", "AGE", "FURLENGTH"]
+ENTITY_KEYS = tuple(REQUIRED_ENTITIES + OPTIONAL_ENTITIES)
+
+# Exact-match shortcuts checked before any NLP work
+_SMALLTALK_NO = frozenset({"no", "nope", "nah"})
+_SMALLTALK_HI = frozenset({"hi", "hey", "hello", "hii", "helo"})
+_SMALLTALK_BYE = frozenset({"bye", "goodbye"})
+_EXIT = frozenset({"exit", "quit", "end"})
+_RESTART = frozenset({"restart", "reset", "new chat"})
+_GREETING_WORDS = ("hi", "hey", "hello")
+_FOLLOWUP_INTENTS = frozenset({"unknown", "other"})
+_NO_INTENT = frozenset({"unknown", None})
+_SKIP_KEYS = frozenset({"PET_TYPE", "NOTICE"})
+
+# ---------------------------------------------------------------------------
+# STATIC LOOKUPS (derived once from SYNONYMS at import time)
+# ---------------------------------------------------------------------------
+_WORD_RE = re.compile(r"\b[a-zA-Z]+\b")
+_VOWEL_RE = re.compile(r"[aeiouAEIOU]")
+
+_SPECIES_OUT_OF_SCOPE = frozenset({
+    "hamster", "hamsters", "rabbit", "rabbits", "bird", "birds",
+    "parrot", "parrots", "fish", "fishes", "snake", "turtle"
+})
+# One regex scan for all out-of-scope species (substring match, as before)
+_SPECIES_OUT_OF_SCOPE_RE = re.compile("|".join(map(re.escape, sorted(_SPECIES_OUT_OF_SCOPE))))
+_SPECIES_TERMS = frozenset({
+    "hamster", "rabbit", "bird", "parrot", "fish", "turtle", "snake", "guinea",
+    "hamsters", "rabbits", "birds", "parrots", "fishes"
+})
+_VALID_BREEDS = frozenset(b.lower() for b in SYNONYMS)
+_SPECIES_OK = frozenset({"dog", "cat"})
+_PET_PLACEHOLDERS = frozenset({"one", "it", "animal", "pet"})
+_AGE_PLACEHOLDERS = frozenset({"one", "1", "single", "johor"})
+
+_COLOR_CANONS = frozenset({
+    "black", "white", "brown", "golden", "cream", "gray",
+    "orange", "yellow", "blue", "red", "tabby", "calico", "tortoiseshell"
+})
+# Variant -> priority (SYNONYMS order), so the earliest listed color still wins
+_COLOR_RANK = {}
+for _canon, _variants in SYNONYMS.items():
+    if _canon.lower() in _COLOR_CANONS:
+        for _v in [_canon] + _variants:
+            _COLOR_RANK.setdefault(_v.lower(), len(_COLOR_RANK))
+_COLOR_VARIANTS = frozenset(_COLOR_RANK)
 
 # ---------------------------------------------------------------------------
 # AUTOCORRECT
 # ---------------------------------------------------------------------------
+_KNOWN_WORDS = (
+    "dog", "cat", "adopt", "adoption", "puppy", "kitten",
+    "male", "female", "small", "large", "brown", "white", "black",
+    "golden", "cream", "short", "long", "fur",
+    "Johor", "Penang", "Melaka", "Selangor", "Kuala", "Lumpur",
+    "Perak", "Sabah", "Sarawak"
+)
+_KNOWN_LOWER = {w.lower(): w for w in _KNOWN_WORDS}
+
 def autocorrect_text(text, known_words=None, threshold=80):
     """Light typo correction for meaningful words only."""
     if known_words is None:
-        known_words = [
-            "dog", "cat", "adopt", "adoption", "puppy", "kitten",
-            "male", "female", "small", "large", "brown", "white", "black",
-            "golden", "cream", "short", "long", "fur",
-            "Johor", "Penang", "Melaka", "Selangor", "Kuala", "Lumpur",
-            "Perak", "Sabah", "Sarawak"
-        ]
-    words, corrected = text.split(), []
-    for w in words:
-        if len(w) <= 2:  # skip very short tokens
-            corrected.append(w)
-            continue
-        match, score, _ = process.extractOne(w, known_words)
-        corrected.append(match if score >= threshold and match.lower() != w.lower() else w)
+        known_words, known_lower = _KNOWN_WORDS, _KNOWN_LOWER
+    else:
+        known_lower = {w.lower(): w for w in known_words}
+    corrected = text.split()
+    # skip very short tokens and words that are already known (no fuzzy match needed)
+    positions = [
+        i for i, w in enumerate(corrected)
+        if len(w) > 2 and w.lower() not in known_lower
+    ]
+    if not positions:
+        return " ".join(corrected)
+
+    # Score every candidate token against every known word in one call
+    queries = [corrected[i] for i in positions]
+    scores = process.cdist(queries, known_words, scorer=fuzz.WRatio,
+                           score_cutoff=threshold, workers=1)
+    best = np.argmax(scores, axis=1)
+    for row, (i, j) in enumerate(zip(positions, best)):
+        match = known_words[j]
+        if scores[row, j] >= threshold and match.lower() != corrected[i].lower():
+            corrected[i] = match
     return " ".join(corrected)
 
+# ---------------------------------------------------------------------------
+# TORCH THREADING
+# ---------------------------------------------------------------------------
+_TORCH_CONFIGURED = False
+
+def _configure_torch_threads():
+    """Use fewer threads for low batch-1 latency (once per process)."""
+    global _TORCH_CONFIGURED
+    if _TORCH_CONFIGURED:
+        return
+    _TORCH_CONFIGURED = True
+    torch.set_num_threads(max(1, (os.cpu_count() or 2) // 2))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # inter-op pool already started in this process; keep its size
+
+# ---------------------------------------------------------------------------
+# NER PREFETCH
+# ---------------------------------------------------------------------------
+def _report_ner_error(future):
+    """Surface errors from a prefetched NER call whose result was not used."""
+    if not future.cancelled() and future.exception() is not None:
+        warnings.warn(f"Prefetched NER failed: {future.exception()}", RuntimeWarning)
+
 # ---------------------------------------------------------------------------
 # CHATBOT PIPELINE
 # ---------------------------------------------------------------------------
@@ -45,9 +134,15 @@ class ChatbotPipeline:
     """End-to-end pet adoption chatbot with clean fallbacks and context."""
 
     def __init__(self):
+        _configure_torch_threads()
         self.intent_clf = IntentClassifier()
         self.ner_extractor = EntityExtractor()
         self.session = {"intent": None, "entities": {}, "greeted": False}
+        # Prefetches NER alongside intent classification on find_pet turns
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        # Last rendered search message and the entity snapshot it was built from
+        self._last_sig = None
+        self._last_desc = None
 
     # -----------------------------------------------------------------------
     # MAIN MESSAGE HANDLER
@@ -59,31 +154,52 @@ class ChatbotPipeline:
         if not user_input:
             return self._get_greeting()
 
-        # --- Typo correction ---
-        user_input = autocorrect_text(user_input)
-
-        # --- Small talk shortcuts ---
+        # --- Small talk shortcuts (before autocorrect / classification) ---
         lower = user_input.lower()
-        if lower in ["no", "nope", "nah"]:
+        if lower in _SMALLTALK_NO:
             return "Alright 😊 Let me know anytime if you change your mind."
-        if lower in ["hi", "hey", "hello"]:
+        if lower in _SMALLTALK_HI:
             self.session["greeted"] = True
             return get_response("greeting")
+        if lower in _SMALLTALK_BYE:
+            # Same session transition as the goodbye intent path
+            self._reset_session(intent="goodbye", greeted=True)
+            return get_response("goodbye")
+
+        # --- Typo correction ---
+        user_input = autocorrect_text(user_input)
+
+        # --- Mid find_pet, start NER in parallel with intent classification ---
+        # Short follow-ups (<= 2 words) skip this: the unknown fallback batches them
+        # with a pseudo-query instead, so a prefetch would cost an extra NER pass.
+        fut_ents = None
+        if self.session.get("intent") == "find_pet" and len(user_input.split()) > 2:
+            fut_ents = self._pool.submit(self.ner_extractor.extract, user_input)
+        try:
+            return self._route_message(user_input, fut_ents)
+        finally:
+            # Drop unused NER without blocking the reply; if it is already running it
+            # finishes under the extractor's lock (and fills its cache)
+            if fut_ents is not None and not fut_ents.cancel():
+                fut_ents.add_done_callback(_report_ner_error)
+
+    def _route_message(self, user_input: str, fut_ents=None) -> str:
+        """Classify intent and route; fut_ents holds prefetched NER output, if any."""
+        lower = user_input.lower()
 
         # --- Intent classification ---
         intent, conf = self.intent_clf.predict(user_input)
 
         # --- Fix false greeting classification ---
-        greeting_words = ["hi", "hey", "hello"]
         if intent == "greeting":
-            if lower not in greeting_words and len(user_input.split()) <= 2 and not any(
-                g in lower for g in greeting_words
+            if lower not in _GREETING_WORDS and len(user_input.split()) <= 2 and not any(
+                g in lower for g in _GREETING_WORDS
             ):
                 intent = "unknown"
 
         # --- Maintain find_pet context for short follow-ups (color/size/gender/state) ---
         if self.session.get("intent") == "find_pet":
-            if len(user_input.split()) <= 2 and len(user_input) > 2 and intent in ["unknown", "other"]:
+            if len(user_input.split()) <= 2 and len(user_input) > 2 and intent in _FOLLOWUP_INTENTS:
                 intent = "find_pet"
 
         # --- Initial greeting check ---
@@ -100,13 +216,14 @@ class ChatbotPipeline:
 
         # --- Intent switching ---
         if self._is_new_intent(intent, prev_intent):
-            self.session = {"intent": intent, "entities": {}, "greeted": True}
+            self._reset_session(intent=intent, greeted=True)
 
         self.session["intent"] = intent
 
         # --- Route by intent ---
         if intent == "find_pet":
-            return self._handle_find_pet(user_input)
+            ents = fut_ents.result() if fut_ents is not None else None
+            return self._handle_find_pet(user_input, ents)
         if intent == "pet_care":
             # RAG PLACEHOLDER
             return "(RAG) 🧠 Fetching pet care advice... (placeholder)"
@@ -124,8 +241,8 @@ class ChatbotPipeline:
     # FIND-PET HANDLER
     # -----------------------------------------------------------------------
     
-    def _handle_find_pet(self, user_input: str) -> str:
-        ents = self._extract_entities(user_input)
+    def _handle_find_pet(self, user_input: str, ents: dict = None) -> str:
+        ents = self._extract_entities(user_input, ents)
 
         if "NOTICE" in ents:
             if "pet" in user_input.lower():
@@ -146,18 +263,21 @@ class ChatbotPipeline:
         """Handles unclear or nonsense inputs gracefully."""
 
         if self.session.get("intent") == "find_pet":
-                
+            raw = None
+
             if len(user_input) > 2 and len(user_input.split()) <= 2:
                 token = user_input.strip()
                 pseudo = f"I want a {token} {self.session['entities'].get('PET_TYPE', 'pet')}"
-                ents = self._extract_entities(pseudo)
+                # Run NER over both candidates as one padded batch
+                raw_pseudo, raw = self.ner_extractor.extract_batch([pseudo, user_input])
+                ents = self._extract_entities(pseudo, dict(raw_pseudo))
                 if not ents or "NOTICE" in ents:
-                    ents = self._extract_entities(user_input)
+                    ents = self._extract_entities(user_input, dict(raw))
                 if ents and "NOTICE" not in ents:
                     return self._update_entities_and_respond(ents)
 
             # Second try, direct extraction
-            ents = self._extract_entities(user_input)
+            ents = self._extract_entities(user_input, dict(raw) if raw is not None else None)
             if "NOTICE" in ents:
                 return ents["NOTICE"]
             if ents:
@@ -182,16 +302,19 @@ class ChatbotPipeline:
     # -----------------------------------------------------------------------
     # ENTITY EXTRACTION & VALIDATION
     # -----------------------------------------------------------------------
-    def _extract_entities(self, text: str):
-        """Runs NER extraction, applies synonym-based fallbacks, and filters invalid or out-of-scope entities."""
-        ents = self.ner_extractor.extract(text)
+    def _extract_entities(self, text: str, ents: dict = None):
+        """Runs NER extraction, applies synonym-based fallbacks, and filters invalid or out-of-scope entities.
+
+        Pass `ents` to reuse raw NER output already computed for `text`.
+        """
+        if ents is None:
+            ents = self.ner_extractor.extract(text)
+
+        text_lower = text.lower()
+        stripped = text.strip()
 
         # --- Quick keyword check for out-of-scope animals ---
-        species_out_of_scope = [
-            "hamster", "hamsters", "rabbit", "rabbits", "bird", "birds",
-            "parrot", "parrots", "fish", "fishes", "snake", "turtle"
-        ]
-        if any(w in text.lower() for w in species_out_of_scope):
+        if _SPECIES_OUT_OF_SCOPE_RE.search(text_lower):
             return {
                 "NOTICE": (
                     "Sorry, I currently only help with cats 🐱 and dogs 🐶. "
@@ -200,71 +323,58 @@ class ChatbotPipeline:
             }
 
         # --- Basic sanity checks ---
-        if not text.strip() or len(text.strip()) < 2:
+        if len(stripped) < 2:
             return {"NOTICE": get_response("unknown")}
-        if len(text) > 4 and not any(ch in "aeiou" for ch in text.lower()):
+        if len(text) > 4 and not _VOWEL_RE.search(text):
             return {"NOTICE": get_response("unknown")}
 
-        # --- Remove placeholders / irrelevant tokens ---
-        if "PET_TYPE" in ents and ents["PET_TYPE"].lower() in ["one", "it", "animal", "pet"]:
-            ents.pop("PET_TYPE")
-        if "AGE" in ents and str(ents["AGE"]).lower() in ["one", "1", "single", "johor"]:
-            ents.pop("AGE")
-
-        # --- Restrict supported species ---
-        if "PET_TYPE" in ents and ents["PET_TYPE"].lower() not in ["dog", "cat"]:
-            return {
-                "NOTICE": (
-                    "Sorry, I currently only help with cats 🐱 and dogs 🐶. "
-                    "Would you like to search for one of those instead?"
-                )
-            }
-
-        # --- Breed validation ---
-        valid_breeds = [b.lower() for b in SYNONYMS.keys()]
-        if "BREED" in ents:
-            breed_val = ents["BREED"].lower()
-            species_terms = [
-                "hamster", "rabbit", "bird", "parrot", "fish", "turtle", "snake", "guinea",
-                "hamsters", "rabbits", "birds", "parrots", "fishes"
-            ]
-            if (
-                breed_val in species_terms
-                or (breed_val not in valid_breeds and not re.search(r"[aeiou]", breed_val))
-            ):
-                ents.pop("BREED")
-
         # --- Color keyword fallback using synonym map ---
-        color_variants = []
-        for canon, variants in SYNONYMS.items():
-            if canon.lower() in [
-                "black", "white", "brown", "golden", "cream", "gray",
-                "orange", "yellow", "blue", "red", "tabby", "calico", "tortoiseshell"
-            ]:
-                color_variants.extend([canon.lower()] + [v.lower() for v in variants])
-
-        # Normalize text for color matching
-        lower_text = autocorrect_text(text.lower())
-        for color in color_variants:
-            if re.search(rf"\b{re.escape(color)}\b", lower_text) or \
-            re.search(rf"\b{re.escape(color)}\s*(color|colour)\b", lower_text) or \
-            re.search(rf"\b(color|colour)\s*{re.escape(color)}\b", lower_text):
-                ents["COLOR"] = canonicalize(color)
-                break
-
-        # --- drop total nonsense ---
+        # Normalize text for color matching; check single words and two-word variants
+        tokens = _WORD_RE.findall(autocorrect_text(text_lower))
+        candidates = set(tokens).union(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        hits = candidates & _COLOR_VARIANTS
+        if hits:
+            ents["COLOR"] = canonicalize(min(hits, key=_COLOR_RANK.get))
+
+        # --- Single pass: placeholders, species, breed validation, nonsense, duplicates ---
+        vals_seen = set()
         for k, v in list(ents.items()):
-            if len(v) < 3 or not any(ch in "aeiou" for ch in v.lower()):
+            v_low = str(v).lower()
+
+            # Remove placeholders / irrelevant tokens
+            if k == "PET_TYPE":
+                if v_low in _PET_PLACEHOLDERS:
+                    ents.pop(k)
+                    continue
+                # Restrict supported species
+                if v_low not in _SPECIES_OK:
+                    return {
+                        "NOTICE": (
+                            "Sorry, I currently only help with cats 🐱 and dogs 🐶. "
+                            "Would you like to search for one of those instead?"
+                        )
+                    }
+            elif k == "AGE" and v_low in _AGE_PLACEHOLDERS:
+                ents.pop(k)
+                continue
+            elif k == "BREED" and (
+                v_low in _SPECIES_TERMS
+                or (v_low not in _VALID_BREEDS and not _VOWEL_RE.search(v_low))
+            ):
                 ents.pop(k)
+                continue
 
-        # --- Prevent duplicate values across different entity types ---
-        vals_seen = {}
-        for k, v in list(ents.items()):
-            v_low = v.lower().strip()
-            if v_low in vals_seen.values():
+            # Drop total nonsense
+            if len(v) < 3 or not _VOWEL_RE.search(v):
+                ents.pop(k)
+                continue
+
+            # Prevent duplicate values across different entity types
+            v_low = v_low.strip()
+            if v_low in vals_seen:
                 ents.pop(k)
             else:
-                vals_seen[k] = v_low
+                vals_seen.add(v_low)
 
         # --- No meaningful entities detected ---
         if not ents:
@@ -296,7 +406,7 @@ class ChatbotPipeline:
             self.session["entities"]["PET_TYPE"] = new_pet
 
         for k, v in ents.items():
-            if k in ["PET_TYPE", "NOTICE"]:
+            if k in _SKIP_KEYS:
                 continue
 
             v = canonicalize(v)
@@ -325,6 +435,10 @@ class ChatbotPipeline:
     # -----------------------------------------------------------------------
     def _confirm_and_search(self) -> str:
         ents = self.session["entities"]
+        sig = tuple(ents.get(k) for k in ENTITY_KEYS)
+        if sig == self._last_sig:
+            return self._last_desc
+
         pet = ents.get("PET_TYPE", "pet")
         state = ents.get("STATE", "your area")
         details = [v for v in [
@@ -334,15 +448,17 @@ class ChatbotPipeline:
         desc = " ".join(details + [pet])
         if not ents.get("BREED"):
             desc += "s"
-        return f"Got it! Searching for {desc} in {state}..."
+        self._last_sig = sig
+        self._last_desc = f"Got it! Searching for {desc} in {state}..."
+        return self._last_desc
 
     # -----------------------------------------------------------------------
     # HELPERS
     # -----------------------------------------------------------------------
     def _is_new_intent(self, intent, prev_intent):
         return (
-            intent not in ["unknown", None]
-            and prev_intent not in ["unknown", None]
+            intent not in _NO_INTENT
+            and prev_intent not in _NO_INTENT
             and intent != prev_intent
         )
 
@@ -369,8 +485,14 @@ class ChatbotPipeline:
             "So, what would you like to do today?"
         )
 
+    def _reset_session(self, intent=None, greeted=False):
+        """Reset session state in place instead of allocating a new session dict."""
+        self.session["intent"] = intent
+        self.session["entities"].clear()
+        self.session["greeted"] = greeted
+
     def reset(self) -> str:
-        self.session = {"intent": None, "entities": {}, "greeted": False}
+        self._reset_session()
         return self._get_greeting()
 
 
@@ -382,10 +504,10 @@ if __name__ == "__main__":
     print("Bot:", bot.handle_message(""))
     while True:
         msg = input("You: ")
-        if msg.lower() in ["exit", "quit", "end"]:
+        if msg.strip().lower() in _EXIT:
             print("Bot: Goodbye! 👋")
             break
-        if msg.lower() in ["restart", "reset", "new chat"]:
+        if msg.strip().lower() in _RESTART:
             print("Bot:", bot.reset())
             continue
         print("Bot:", bot.handle_message(msg))
\ No newline at end of file
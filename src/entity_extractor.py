@@ -1,25 +1,146 @@
 import os
+import json
+import threading
+import warnings
+import torch
 from transformers import pipeline
+try:
+    from optimum.onnxruntime import ORTModelForTokenClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+except ImportError:  # optimum[onnxruntime] + onnx are optional; fall back to PyTorch
+    ORTModelForTokenClassification = None
 from synonyms import SYNONYMS, canonicalize, postprocess_entities
 
+STATES = [
+    "Kuala Lumpur","Selangor","Penang","Johor","Sabah","Sarawak","Perak",
+    "Negeri Sembilan","Melaka","Pahang","Kedah","Kelantan","Terengganu",
+    "Putrajaya","Labuan"
+]
+
+# State variant (lowercase, 1-2 words) -> (priority, canonical state).
+# Priority follows SYNONYMS order so the first listed state still wins.
+_STATE_VARIANTS = {}
+for _rank, _canon in enumerate(c for c in SYNONYMS if c in STATES):
+    for _v in SYNONYMS[_canon]:
+        _STATE_VARIANTS.setdefault(_v.lower(), (_rank, _canon))
+
+def _hub_revision(model_repo):
+    """Current commit sha of model_repo on the Hub, or None if unknown (local path / offline)."""
+    if os.path.isdir(model_repo):
+        return None
+    try:
+        from huggingface_hub import HfApi
+        return HfApi().model_info(model_repo).sha
+    except Exception:
+        return None
+
+
+def _load_quantized_ner(model_repo, onnx_dir):
+    """Export the NER model to ONNX with dynamic int8 quantization (cached on disk).
+
+    The export is reused only if it was built from the same repo and, when the Hub
+    can be reached, the same revision; otherwise it is rebuilt.
+    """
+    file_name = "model_quantized.onnx"
+    source_path = os.path.join(onnx_dir, "source.json")
+    revision = _hub_revision(model_repo)
+
+    source = None
+    if os.path.exists(os.path.join(onnx_dir, file_name)) and os.path.exists(source_path):
+        with open(source_path, "r") as f:
+            source = json.load(f)
+    stale = (
+        source is None
+        or source.get("model_repo") != model_repo
+        or (revision is not None and source.get("revision") != revision)
+    )
+
+    if stale:
+        ort_model = ORTModelForTokenClassification.from_pretrained(
+            model_repo, export=True, revision=revision
+        )
+        quantizer = ORTQuantizer.from_pretrained(ort_model)
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+        quantizer.quantize(save_dir=onnx_dir, quantization_config=qconfig)
+        with open(source_path, "w") as f:
+            json.dump({"model_repo": model_repo, "revision": revision}, f)
+    return ORTModelForTokenClassification.from_pretrained(onnx_dir, file_name=file_name)
+
+
 class EntityExtractor:
-    def __init__(self, model_repo="kerrringuo/pet-adoption-ner"):
+    def __init__(self, model_repo="kerrringuo/pet-adoption-ner", onnx_dir=None, cache_size=512):
         """Load fine-tuned NER transformer directly from Hugging Face Hub"""
 
+        if onnx_dir is None:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            # One export directory per source repo
+            repo_dir = model_repo.strip("/\\").replace("/", "__").replace("\\", "__")
+            onnx_dir = os.path.join(base_dir, "../models/ner_onnx", repo_dir)
+
+        # Prefer the quantized ONNX Runtime model when optimum is installed
+        model = model_repo
+        if ORTModelForTokenClassification is not None:
+            try:
+                model = _load_quantized_ner(model_repo, onnx_dir)
+            except Exception as e:  # export / quantization is best-effort
+                warnings.warn(f"ONNX NER unavailable, using PyTorch: {e}", RuntimeWarning)
+
         # Load the NER model
         self.ner_pipe = pipeline(
             "ner",
-            model=model_repo,
+            model=model,
             tokenizer=model_repo,
-            aggregation_strategy="simple"
+            aggregation_strategy="simple",
+            device=-1
         )
 
+        # Entities per stripped input (FIFO eviction); the model is cased, so no lowercasing
+        self._cache = {}
+        self._cache_size = cache_size
+        # HF pipelines / fast tokenizers and the cache are not thread-safe
+        self._lock = threading.Lock()
+
     def extract(self, text):
         """Return dict of canonicalized entity_name: value."""
         if not text or not text.strip():
             return {}
 
-        results = self.ner_pipe(text)
+        key = text.strip()
+        with self._lock:
+            entities = self._cache.get(key)
+            if entities is None:
+                entities = self._build_entities(key, self._run_ner(key))
+                self._remember(key, entities)
+            return dict(entities)
+
+    def extract_batch(self, texts):
+        """Like extract(), but runs the NER model once over a list of texts."""
+        keys = [t.strip() if t else "" for t in texts]
+        with self._lock:
+            found = {k: self._cache[k] for k in keys if k in self._cache}
+            todo = list(dict.fromkeys(k for k in keys if k and k not in found))
+            if todo:
+                # One padded forward pass for all uncached texts (pipeline defaults to batch_size=1)
+                for k, results in zip(todo, self._run_ner(todo, batch_size=len(todo))):
+                    found[k] = self._build_entities(k, results)
+                    self._remember(k, found[k])
+            return [dict(found[k]) if k else {} for k in keys]
+
+    @torch.inference_mode()
+    def _run_ner(self, texts, batch_size=1):
+        """Run the NER pipeline without autograd tracking."""
+        return self.ner_pipe(texts, batch_size=batch_size)
+
+    def _remember(self, key, entities):
+        """Store entities for key, evicting the oldest entry when full."""
+        if self._cache_size <= 0:
+            return
+        if len(self._cache) >= self._cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = entities
+
+    def _build_entities(self, text, results):
+        """Turn raw pipeline output for one text into canonicalized entities."""
         entities = {}
 
         # Collect recognized entities
@@ -32,18 +153,13 @@ class EntityExtractor:
         entities = postprocess_entities(entities)
 
         # Fallback keyword check (handles cases like "jb")
-        lowered_text = text.lower()
-        for canon, variants in SYNONYMS.items():
-            for v in variants:
-                if f" {v.lower()} " in f" {lowered_text} ":
-                    # Assign based on what kind of canonical term this is
-                    if canon in [
-                        "Kuala Lumpur","Selangor","Penang","Johor","Sabah","Sarawak","Perak",
-                        "Negeri Sembilan","Melaka","Pahang","Kedah","Kelantan","Terengganu",
-                        "Putrajaya","Labuan"
-                    ] and "STATE" not in entities:
-                        entities["STATE"] = canon
-                    break
+        # Single pass over words and word pairs instead of scanning every variant
+        if "STATE" not in entities:
+            words = text.lower().split()
+            candidates = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            hits = [_STATE_VARIANTS[c] for c in candidates if c in _STATE_VARIANTS]
+            if hits:
+                entities["STATE"] = min(hits)[1]
 
         return entities
 
@@ -1,10 +1,39 @@
 import os
 import json
+from functools import lru_cache
 import joblib
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
 
+def _linear_params(clf):
+    """Return (mean, scale, W, b) so that ((emb - mean) / scale) @ W + b gives clf's logits.
+
+    Supports a bare LogisticRegression or a Pipeline of StandardScaler -> LogisticRegression.
+    Returns None for anything else. Everything stays float64: the fitted scaler has
+    scale_ entries near 1e-33, which float32 cannot represent faithfully.
+    """
+    steps = list(clf.named_steps.values()) if hasattr(clf, "named_steps") else [clf]
+    *transforms, est = steps
+    if len(transforms) > 1 or not hasattr(est, "coef_"):
+        return None
+
+    mean, scale = 0.0, 1.0
+    if transforms:
+        scaler = transforms[0]
+        if not hasattr(scaler, "scale_") and not hasattr(scaler, "mean_"):
+            return None
+        if getattr(scaler, "with_mean", False):
+            mean = np.asarray(scaler.mean_, dtype=np.float64)
+        if getattr(scaler, "scale_", None) is not None:
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    W = np.ascontiguousarray(est.coef_.T, dtype=np.float64)
+    b = np.asarray(est.intercept_, dtype=np.float64)
+    return mean, scale, W, b
+
+
 class IntentClassifier:
     def __init__(self, model_path=None):
         """Load the intent classifier and supporting metadata."""
@@ -24,27 +53,108 @@ class IntentClassifier:
         # Load model, metadata, and labels
         self.clf = joblib.load(model_path)
 
+        # Raw scaler + LogReg parameters so predict() can skip sklearn's predict_proba
+        # wrapper; W is a contiguous (dim, n_classes) matrix for a single GEMV.
+        # Falls back to predict_proba if the shortcut does not reproduce it.
+        self._linear = _linear_params(self.clf)
+        if self._linear is not None and not self._check_linear():
+            self._linear = None
+
         with open(meta_path, "r") as f:
             self.meta = json.load(f)
         with open(labels_path, "r") as f:
             self.labels = json.load(f)
 
-        # Initialize encoder
+        # Initialize encoder up front so the first user turn doesn't pay for loading
         embedding_model = self.meta.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
-        self.encoder = SentenceTransformer(embedding_model)
+        self.encoder = self._load_encoder(embedding_model)
 
         # Confidence threshold (default 0.7)
         self.threshold = float(self.meta.get("threshold", 0.7))
 
+        # Per-instance caches keyed on normalized text (MiniLM is uncased)
+        self._encode_cached = lru_cache(maxsize=1024)(self._encode)
+        self._top1_cached = lru_cache(maxsize=1024)(self._predict_top1)
+
+    def _load_encoder(self, embedding_model):
+        """Load MiniLM, optionally int8-quantized / length-capped via metadata.
+
+        Both options change the embeddings the classifier was trained on (the fitted
+        scaler amplifies some dims by ~1e32), so they stay off unless the metadata
+        enables them after re-checking intents and the threshold against FP32.
+        """
+        encoder = SentenceTransformer(embedding_model)
+        if self.meta.get("quantize_encoder", False):
+            encoder[0].auto_model = torch.ao.quantization.quantize_dynamic(
+                encoder[0].auto_model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        if "max_seq_length" in self.meta:
+            encoder.max_seq_length = int(self.meta["max_seq_length"])
+        return encoder
+
+    def _encode(self, text):
+        """Encode a single text and return the embedding as raw bytes."""
+        emb = self.encoder.encode(
+            text, convert_to_numpy=True, show_progress_bar=False, batch_size=1
+        ).astype(np.float32, copy=False)
+        return emb.tobytes()
+
+    def _top1(self, emb):
+        """Return (label index, confidence) for a (1, dim) embedding."""
+        if self._linear is None:
+            probs = self.clf.predict_proba(emb)[0]
+            idx = int(np.argmax(probs))
+            return idx, float(probs[idx])
+
+        mean, scale, W, b = self._linear
+        logits = (((emb.astype(np.float64) - mean) / scale) @ W + b)[0]
+        idx = int(np.argmax(logits))
+        conf = float(np.exp(logits[idx] - np.logaddexp.reduce(logits)))
+        return idx, conf
+
+    def _probe_embeddings(self, n_probe, dim, rng):
+        """Random embeddings in the region the scaler was fitted on.
+
+        Dims with a near-zero fitted scale are pinned to their mean: any spread there
+        is amplified enough to saturate every softmax and hide wrong weights.
+        """
+        steps = list(self.clf.named_steps.values()) if hasattr(self.clf, "named_steps") else []
+        scaler = steps[0] if len(steps) > 1 else None
+        center = getattr(scaler, "mean_", None)
+        spread = getattr(scaler, "scale_", None)
+        if center is None or spread is None:
+            probe = rng.standard_normal((n_probe, dim))
+            return (probe / np.linalg.norm(probe, axis=1, keepdims=True)).astype(np.float32)
+
+        spread = np.where(spread < 1e-6 * np.median(spread), 0.0, spread)
+        return (center + spread * rng.standard_normal((n_probe, dim))).astype(np.float32)
+
+    def _check_linear(self, n_probe=64):
+        """Check the raw-weight shortcut against predict_proba on in-distribution probes."""
+        dim = self._linear[2].shape[0]
+        probe = self._probe_embeddings(n_probe, dim, np.random.default_rng(0))
+
+        probs = self.clf.predict_proba(probe)
+        # Saturated probes (all confidences ~1.0) would make the comparison meaningless
+        if np.all(probs.max(axis=1) > 1 - 1e-6):
+            return False
+        for row, p in zip(probe, probs):
+            idx, conf = self._top1(row.reshape(1, -1))
+            if idx != int(np.argmax(p)) or not np.isclose(conf, p[idx], atol=1e-6):
+                return False
+        return True
+
+    def _predict_top1(self, text):
+        """Return (label index, softmax confidence) of the top class for a single text."""
+        emb = np.frombuffer(self._encode_cached(text), dtype=np.float32).reshape(1, -1)
+        return self._top1(emb)
+
     def predict(self, text):
         """Return (intent, confidence) for input text."""
         if not text or not text.strip():
             return "unknown", 0.0
 
-        emb = self.encoder.encode([text])
-        probs = self.clf.predict_proba(emb)[0]
-        idx = int(np.argmax(probs))
-        conf = float(probs[idx])
+        idx, conf = self._top1_cached(text.strip().lower())
         intent = self.labels[idx] if conf >= self.threshold else "unknown"
         return intent, conf
 
@@ -1,5 +1,6 @@
 # src/synonyms.py
 import re
+from functools import lru_cache
 from rapidfuzz import process, fuzz
 
 SYNONYMS = {
@@ -79,6 +80,21 @@ SYNONYMS = {
 }
 
 
+# Reverse lookup: lowercase variant -> canonical term (first listed canonical wins)
+_REVERSE = {}
+for _canon, _variants in SYNONYMS.items():
+    for _v in [_canon] + _variants:
+        _REVERSE.setdefault(_v.lower(), _canon)
+
+# Flat fuzzy-match choices with the canonical term for each position
+_FUZZY_CANONS = [canon for canon, variants in SYNONYMS.items() for _ in [canon] + variants]
+_FUZZY_CHOICES = [v.lower() for canon, variants in SYNONYMS.items() for v in [canon] + variants]
+
+_KITTEN_TERMS = frozenset({"kitten", "kittens"})
+_PUPPY_TERMS = frozenset({"puppy", "puppies", "pup"})
+
+
+@lru_cache(maxsize=1024)
 def canonicalize(text, threshold=85):
     """Return canonical form if synonym or fuzzy match found."""
     if not text:
@@ -90,19 +106,13 @@ def canonicalize(text, threshold=85):
     text = text.replace("_", " ")
 
     # Exact and synonym match
-    for canon, variants in SYNONYMS.items():
-        all_variants = [canon.lower()] + [v.lower() for v in variants]
-        if text in all_variants:
-            return canon
+    if text in _REVERSE:
+        return _REVERSE[text]
 
     # Fuzzy fallback across all variants
-    all_terms = {canon: [canon] + vals for canon, vals in SYNONYMS.items()}
-    flat = [(canon, variant.lower()) for canon, variants in all_terms.items() for variant in variants]
-    best_match = process.extractOne(text, [v for _, v in flat], scorer=fuzz.token_sort_ratio)
+    best_match = process.extractOne(text, _FUZZY_CHOICES, scorer=fuzz.token_sort_ratio)
     if best_match and best_match[1] >= threshold:
-        for canon, variant in flat:
-            if variant == best_match[0]:
-                return canon
+        return _FUZZY_CANONS[best_match[2]]
 
     return text
 
@@ -112,10 +122,10 @@ def postprocess_entities(entities):
     ents = dict(entities)
 
     pet_type = ents.get("PET_TYPE", "").lower()
-    if pet_type in ["kitten", "kittens"]:
+    if pet_type in _KITTEN_TERMS:
         ents["PET_TYPE"] = "cat"
         ents["AGE"] = "baby"
-    elif pet_type in ["puppy", "puppies", "pup"]:
+    elif pet_type in _PUPPY_TERMS:
         ents["PET_TYPE"] = "dog"
         ents["AGE"] = "baby"
 